@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Build and query a compact xor-filter prefilter for `Adblock/Adblock.list`.
+
+Usage:
+  python adblock_filter.py build [--list PATH] [--out PATH]
+  python adblock_filter.py lookup DOMAIN [DOMAIN ...] [--filter PATH]
+  python adblock_filter.py bench [--list PATH] [--mrs PATH] [--queries N]
+
+The `DOMAIN-SUFFIX` entries of the list are stored as an 8-bit xor filter
+(about 1.23 bytes per entry, ~0.4% false positives). Every filter hit is
+confirmed against the exact suffix set, which is kept behind the filter as
+one sorted, newline-separated blob, so lookups never return false positives.
+
+Artifact layout (little endian):
+  header  : magic b'XORF', version (u8), 3 pad bytes, seed (u64),
+            block_length (u32), key_count (u32), exact_length (u32)
+  filter  : 3 * block_length fingerprint bytes
+  exact   : zlib-compressed sorted suffixes joined by b'\\n'
+
+A key's three slots and fingerprint come from one 13-byte blake2b digest of
+the UTF-8 key, keyed with the seed.
+"""
+from __future__ import annotations
+import argparse
+import array
+import hashlib
+import os
+import random
+import struct
+import sys
+import time
+import tracemalloc
+import zlib
+from typing import Sequence
+try:
+    import zstandard  # Optional: only used to report decompressed MRS size
+except Exception:
+    zstandard = None
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LIST = os.path.join(ROOT_DIR, "Adblock", "Adblock.list")
+DEFAULT_OUT = os.path.join(ROOT_DIR, "Adblock", "Adblock.xorf")
+DEFAULT_MRS = os.path.join(ROOT_DIR, "Clash-RuleSet-MRS", "Adblock", "Adblock.domain.mrs")
+
+MAGIC = b"XORF"
+VERSION = 2
+HEADER = struct.Struct("<4sB3xQIII")
+# blake2b digest keyed by the seed: three slot words and the fingerprint byte
+PROBE = struct.Struct("<IIIB")
+MAX_BUILD_ATTEMPTS = 100
+
+
+def normalize_domain(domain: str) -> str:
+    """Lower-case `domain` and strip surrounding whitespace and dots."""
+    return domain.strip().strip(".").lower()
+
+
+def parse_suffixes(path: str) -> list[str]:
+    """Return the unique, normalized `DOMAIN-SUFFIX` values of a `.list` file."""
+    out = set()
+    with open(path, "r", encoding="utf8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split(",")
+            if len(parts) >= 2 and parts[0].strip() == "DOMAIN-SUFFIX":
+                value = normalize_domain(parts[1])
+                if value:
+                    out.add(value)
+    return sorted(out)
+
+
+def iter_suffixes(domain: str):
+    """Yield `domain` and each of its parent domains, longest first."""
+    domain = normalize_domain(domain)
+    while domain:
+        yield domain
+        dot = domain.find(".")
+        if dot < 0:
+            return
+        domain = domain[dot + 1:]
+
+
+def _hasher(seed: int):
+    # One keyed blake2b call yields the three slot words and the fingerprint,
+    # so a probe does no 64-bit arithmetic at the Python level
+    return hashlib.blake2b(digest_size=PROBE.size, key=seed.to_bytes(8, "little"))
+
+
+def _probe(hasher, key: str, block_length: int) -> tuple[int, int, int, int]:
+    h = hasher.copy()
+    h.update(key.encode("utf8"))
+    a, b, c, fingerprint = PROBE.unpack(h.digest())
+    return (
+        (a * block_length) >> 32,
+        ((b * block_length) >> 32) + block_length,
+        ((c * block_length) >> 32) + 2 * block_length,
+        fingerprint,
+    )
+
+
+def build_xor8(keys: list[str], seed: int | None = None, avoid: Sequence[str] = ()) -> tuple[int, int, bytearray]:
+    """Build an xor8 filter over `keys`.
+
+    Seeds under which any of `avoid` would be a false positive are rejected;
+    pass the hot probes (e.g. bare TLDs) that every lookup walks through.
+    Returns `(seed, block_length, fingerprints)`. Raises RuntimeError if no
+    usable seed is found after MAX_BUILD_ATTEMPTS tries.
+    """
+    capacity = 32 + (123 * len(keys) + 99) // 100
+    block_length = capacity // 3
+    size = 3 * block_length
+    rng = random.Random(seed)
+
+    for _ in range(MAX_BUILD_ATTEMPTS):
+        cur_seed = rng.getrandbits(64)
+        hasher = _hasher(cur_seed)
+        probes = [_probe(hasher, k, block_length) for k in keys]
+        counts = [0] * size
+        xormask = [0] * size
+        for i, probe in enumerate(probes):
+            for s in probe[:3]:
+                counts[s] += 1
+                xormask[s] ^= i
+
+        # A slot with count 1 holds exactly one key, whose index is its xormask
+        queue = [i for i in range(size) if counts[i] == 1]
+        stack = []
+        while queue:
+            idx = queue.pop()
+            if counts[idx] != 1:
+                continue
+            i = xormask[idx]
+            stack.append((idx, i))
+            for s in probes[i][:3]:
+                counts[s] -= 1
+                xormask[s] ^= i
+                if counts[s] == 1:
+                    queue.append(s)
+
+        if len(stack) != len(keys):
+            continue
+
+        fingerprints = bytearray(size)
+        for idx, i in reversed(stack):
+            h0, h1, h2, fingerprint = probes[i]
+            fingerprints[idx] = fingerprint ^ fingerprints[h0] ^ fingerprints[h1] ^ fingerprints[h2]
+
+        collides = False
+        for key in avoid:
+            h0, h1, h2, fingerprint = _probe(hasher, key, block_length)
+            if fingerprint == fingerprints[h0] ^ fingerprints[h1] ^ fingerprints[h2]:
+                collides = True
+                break
+        if not collides:
+            return cur_seed, block_length, fingerprints
+
+    raise RuntimeError(f"failed to build xor filter for {len(keys)} keys after {MAX_BUILD_ATTEMPTS} attempts")
+
+
+def build_artifact(keys: list[str]) -> bytes:
+    """Return the serialized artifact for sorted `keys`."""
+    tlds = sorted({k.rsplit(".", 1)[-1] for k in keys} - set(keys))
+    # Seed the search from the key set itself so rebuilding the same list
+    # produces a byte-identical artifact
+    digest = hashlib.blake2b("\n".join(keys).encode("utf8"), digest_size=8).digest()
+    seed, block_length, fingerprints = build_xor8(keys, seed=int.from_bytes(digest, "little"), avoid=tlds)
+    exact = zlib.compress("\n".join(keys).encode("utf8"), 9)
+    header = HEADER.pack(MAGIC, VERSION, seed, block_length, len(keys), len(exact))
+    return header + bytes(fingerprints) + exact
+
+
+def write_artifact(path: str, keys: list[str]) -> int:
+    """Build the artifact for sorted `keys` and write it to `path`. Returns bytes written."""
+    data = build_artifact(keys)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+class SuffixFilter:
+    """Read-only `DOMAIN-SUFFIX` matcher backed by an xor filter artifact.
+
+    The exact suffix blob is only decompressed on the first filter hit, so a
+    stream of misses costs just the fingerprint table.
+    """
+
+    def __init__(self, data: bytes):
+        if len(data) < HEADER.size:
+            raise ValueError("truncated xor filter artifact")
+        magic, version, seed, block_length, key_count, exact_length = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"not an xor filter artifact (magic {magic!r})")
+        if version != VERSION:
+            raise ValueError(f"unsupported xor filter version {version}")
+        start = HEADER.size
+        end = start + 3 * block_length
+        if len(data) != end + exact_length:
+            raise ValueError("xor filter artifact size does not match header")
+        self.seed = seed
+        self.block_length = block_length
+        self.key_count = key_count
+        self.fingerprints = bytes(data[start:end])
+        self._hasher = _hasher(seed)
+        self._compressed = bytes(data[end:])
+        self._exact = None
+        self._offsets = None
+
+    @classmethod
+    def load(cls, path: str) -> "SuffixFilter":
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def _load_exact(self):
+        blob = zlib.decompress(self._compressed)
+        offsets = array.array("I", [0])
+        pos = blob.find(b"\n")
+        while pos >= 0:
+            offsets.append(pos + 1)
+            pos = blob.find(b"\n", pos + 1)
+        offsets.append(len(blob) + 1)
+        self._exact = blob
+        self._offsets = offsets
+        self._compressed = b""
+
+    def _exact_contains(self, key: bytes) -> bool:
+        if self._exact is None:
+            self._load_exact()
+        blob, offsets = self._exact, self._offsets
+        lo, hi = 0, len(offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            item = blob[offsets[mid]:offsets[mid + 1] - 1]
+            if item < key:
+                lo = mid + 1
+            elif item > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def may_contain(self, key: str) -> bool:
+        """Filter-only membership test for an already normalized key."""
+        h0, h1, h2, fingerprint = _probe(self._hasher, key, self.block_length)
+        fp = self.fingerprints
+        return fingerprint == fp[h0] ^ fp[h1] ^ fp[h2]
+
+    def __contains__(self, key: str) -> bool:
+        key = normalize_domain(key)
+        return self.may_contain(key) and self._exact_contains(key.encode("utf8"))
+
+    def match(self, domain: str) -> str | None:
+        """Return the listed suffix that matches `domain`, or None."""
+        for suffix in iter_suffixes(domain):
+            if self.may_contain(suffix) and self._exact_contains(suffix.encode("utf8")):
+                return suffix
+        return None
+
+
+def set_match(suffixes: set[str], domain: str) -> str | None:
+    """Reference matcher over a plain Python set, used by `bench`."""
+    for suffix in iter_suffixes(domain):
+        if suffix in suffixes:
+            return suffix
+    return None
+
+
+def _random_miss_domains(count: int, suffixes: set[str], seed: int = 1) -> list[str]:
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz0123456789"
+    tlds = ["com", "net", "org", "cn", "io", "jp"]
+    out = []
+    while len(out) < count:
+        labels = ["".join(rng.choice(alphabet) for _ in range(rng.randint(3, 12))) for _ in range(rng.randint(1, 3))]
+        domain = ".".join(labels + [rng.choice(tlds)])
+        if set_match(suffixes, domain) is None:
+            out.append(domain)
+    return out
+
+
+def _measure(factory):
+    tracemalloc.start()
+    obj = factory()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current
+
+
+def _time_per_query(fn, queries: list[str], repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for q in queries:
+            fn(q)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(queries) * 1e9
+
+
+def bench(list_path: str, mrs_path: str, queries: int) -> int:
+    """Print resident memory and miss latency of a set and of the xor filter.
+
+    A miss still costs several times a set lookup: a set probe reuses the
+    string's cached hash, while every filter probe encodes the key and runs
+    blake2b over it before indexing the table. The filter trades that CPU for
+    memory. The MRS file is reported by size only; its succinct domain trie
+    is not decoded here, so MRS memory and latency are not measured.
+    """
+    keys = parse_suffixes(list_path)
+    print(f"Loaded {len(keys)} DOMAIN-SUFFIX entries from {list_path}")
+
+    start = time.perf_counter()
+    data = build_artifact(keys)
+    print(f"Built xor filter in {time.perf_counter() - start:.2f}s ({len(data)} bytes artifact)")
+
+    # Measure the set including its strings, as a client would hold it
+    suffixes, set_mem = _measure(lambda: set(parse_suffixes(list_path)))
+    misses = _random_miss_domains(queries, suffixes)
+    set_ns = _time_per_query(lambda d: set_match(suffixes, d), misses)
+
+    # Follow one SuffixFilter instance from load through its first hit
+    tracemalloc.start()
+    filt = SuffixFilter(data)
+    before_hit, _ = tracemalloc.get_traced_memory()
+    fingerprint_mem = sys.getsizeof(filt.fingerprints)
+    compressed_mem = sys.getsizeof(filt._compressed)
+    filt._load_exact()
+    after_hit, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    filt_ns = _time_per_query(filt.match, misses)
+    exact_mem = sys.getsizeof(filt._exact) + sys.getsizeof(filt._offsets)
+
+    probes = [s for d in misses for s in iter_suffixes(d)]
+    confirmed = sum(1 for s in probes if filt.may_contain(s))
+
+    print()
+    print(f"{'form':<34} {'resident bytes':>15} {'miss ns/query':>14}")
+    print(f"{'python set':<34} {set_mem:>15} {set_ns:>14.0f}")
+    print(f"{'  fingerprint table':<34} {fingerprint_mem:>15} {'-':>14}")
+    print(f"{'  compressed exact blob':<34} {compressed_mem:>15} {'-':>14}")
+    print(f"{'  decompressed blob + offsets':<34} {exact_mem:>15} {'-':>14}")
+    print(f"{'xor filter total, before any hit':<34} {before_hit:>15} {'-':>14}")
+    print(f"{'xor filter total, after first hit':<34} {after_hit:>15} {filt_ns:>14.0f}")
+    if os.path.exists(mrs_path):
+        mrs_size = os.path.getsize(mrs_path)
+        print(f"{'mrs (on disk, zstd)':<34} {mrs_size:>15} {'-':>14}")
+        if zstandard is not None:
+            with open(mrs_path, "rb") as f:
+                raw = zstandard.ZstdDecompressor().stream_reader(f).read()
+            print(f"{'mrs (decompressed)':<34} {len(raw):>15} {'-':>14}")
+        else:
+            print("(install `zstandard` to report the decompressed MRS size)")
+        print("(MRS resident memory and miss latency are not measured: its domain trie is not decoded here)")
+    else:
+        print(f"MRS file not found: {mrs_path}")
+    print()
+    print(f"Filter false-positive probes: {confirmed} of {len(probes)}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Compile the list into an xor filter artifact")
+    p_build.add_argument("--list", default=DEFAULT_LIST, help="Path to the source .list file")
+    p_build.add_argument("--out", default=DEFAULT_OUT, help="Path of the artifact to write")
+
+    p_lookup = sub.add_parser("lookup", help="Match domains against an artifact")
+    p_lookup.add_argument("domains", nargs="+", help="Domains to look up")
+    p_lookup.add_argument("--filter", default=DEFAULT_OUT, help="Path to the artifact")
+
+    p_bench = sub.add_parser("bench", help="Compare memory and miss latency with a plain set and the MRS file")
+    p_bench.add_argument("--list", default=DEFAULT_LIST, help="Path to the source .list file")
+    p_bench.add_argument("--mrs", default=DEFAULT_MRS, help="Path to the matching .mrs file")
+    p_bench.add_argument("--queries", type=int, default=20000, help="Number of random miss queries")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if not os.path.exists(args.list):
+            print(f"ERROR: list file not found: {args.list}")
+            return 2
+        keys = parse_suffixes(args.list)
+        size = write_artifact(args.out, keys)
+        print(f"Wrote {len(keys)} suffixes ({size} bytes) to {args.out}")
+        return 0
+
+    if args.command == "lookup":
+        if not os.path.exists(args.filter):
+            print(f"ERROR: filter artifact not found: {args.filter} (run `build` first)")
+            return 2
+        filt = SuffixFilter.load(args.filter)
+        for domain in args.domains:
+            hit = filt.match(domain)
+            print(f"{domain}: {'match ' + hit if hit else 'no match'}")
+        return 0
+
+    if not os.path.exists(args.list):
+        print(f"ERROR: list file not found: {args.list}")
+        return 2
+    return bench(args.list, args.mrs, args.queries)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
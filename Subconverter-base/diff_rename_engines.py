@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Differential check of the `node_pref.rename_node` chain across two engines.
+
+Usage: python diff_rename_engines.py [--toml PATH] [--cases PATH] [--golden PATH]
+                                     [--write-golden] [--subconverter] [--ucp]
+                                     [--unset-empty] [--alt-bsux] [--multiline]
+                                     [--extended] [--jobs N] [--out PATH]
+
+The reference engine is `apply_rules` from `test_rename_rules.py` (the
+`regex` module, with its `\\x{...}` and `$1` rewrites). The second engine
+calls libpcre2-8 directly through ctypes and gets the patterns and `$1`
+replacements exactly as written in the TOML. Every name is run through
+both chains and the final names are diffed one by one; large corpora are
+split into chunks and processed in parallel worker processes.
+
+PCRE2 options default to PCRE2_UTF with a global substitution and can be
+widened with --ucp, --unset-empty, --alt-bsux, --multiline and
+--extended. The combination meant to match subconverter is --subconverter:
+PCRE2_UTF | PCRE2_ALT_BSUX | PCRE2_MULTILINE at compile time and
+SUBSTITUTE_GLOBAL | SUBSTITUTE_EXTENDED at substitution, as read from its
+jpcre2-based `regReplace` (no UCP, no UNSET_EMPTY). The options used are
+printed and stored in the report, so a clean run can be traced back to
+the exact engine configuration it was checked with. Rules PCRE2 refuses to
+compile and substitutions it fails at match time are reported per rule
+index, so a rejected rule is not mistaken for a different match.
+
+With --golden, both engines are also compared against a saved list of
+expected outputs (the JSON written by --write-golden, or a
+`test_rename_rules.py --json` results file), so a faster engine variant
+can be checked against the reference output exactly.
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import ctypes
+import ctypes.util
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+DEFAULT_TOML = os.path.join(os.path.dirname(__file__), "AllSub-AdBlock.toml")
+DEFAULT_OUT = os.path.join(os.path.dirname(__file__), "diff_results.json")
+DEFAULT_GOLDEN = os.path.join(os.path.dirname(__file__), "golden_rename.json")
+CHUNK_SIZE = 256
+
+PCRE2_ALT_BSUX = 0x00000002
+PCRE2_MULTILINE = 0x00000400
+PCRE2_UCP = 0x00020000
+PCRE2_UTF = 0x00080000
+PCRE2_SUBSTITUTE_GLOBAL = 0x00000100
+PCRE2_SUBSTITUTE_EXTENDED = 0x00000200
+PCRE2_SUBSTITUTE_UNSET_EMPTY = 0x00000400
+PCRE2_SUBSTITUTE_OVERFLOW_LENGTH = 0x00001000
+PCRE2_ERROR_NOMEMORY = -48
+PCRE2_CONFIG_VERSION = 11
+
+COMPILE_FLAGS = {
+    "PCRE2_UTF": PCRE2_UTF,
+    "PCRE2_UCP": PCRE2_UCP,
+    "PCRE2_ALT_BSUX": PCRE2_ALT_BSUX,
+    "PCRE2_MULTILINE": PCRE2_MULTILINE,
+}
+SUBSTITUTE_FLAGS = {
+    "PCRE2_SUBSTITUTE_GLOBAL": PCRE2_SUBSTITUTE_GLOBAL,
+    "PCRE2_SUBSTITUTE_EXTENDED": PCRE2_SUBSTITUTE_EXTENDED,
+    "PCRE2_SUBSTITUTE_UNSET_EMPTY": PCRE2_SUBSTITUTE_UNSET_EMPTY,
+}
+
+
+def _import_reference():
+    # test_rename_rules prints the engine it picked on import; keep workers quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        import test_rename_rules
+    return test_rename_rules
+
+
+def _load_pcre2():
+    names = [ctypes.util.find_library("pcre2-8"), "libpcre2-8.so.0", "libpcre2-8.dylib", "pcre2-8.dll"]
+    for name in names:
+        if not name:
+            continue
+        try:
+            lib = ctypes.CDLL(name)
+        except OSError:
+            continue
+        lib.pcre2_compile_8.restype = ctypes.c_void_p
+        lib.pcre2_compile_8.argtypes = [
+            ctypes.c_char_p, ctypes.c_size_t, ctypes.c_uint32,
+            ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_size_t), ctypes.c_void_p,
+        ]
+        lib.pcre2_code_free_8.argtypes = [ctypes.c_void_p]
+        lib.pcre2_match_data_create_from_pattern_8.restype = ctypes.c_void_p
+        lib.pcre2_match_data_create_from_pattern_8.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        lib.pcre2_match_data_free_8.argtypes = [ctypes.c_void_p]
+        lib.pcre2_substitute_8.restype = ctypes.c_int
+        lib.pcre2_substitute_8.argtypes = [
+            ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t, ctypes.c_size_t, ctypes.c_uint32,
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t,
+            ctypes.c_char_p, ctypes.POINTER(ctypes.c_size_t),
+        ]
+        lib.pcre2_get_error_message_8.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_size_t]
+        lib.pcre2_config_8.argtypes = [ctypes.c_uint32, ctypes.c_void_p]
+        return lib
+    return None
+
+
+class Pcre2Engine:
+    """Apply rename rules with libpcre2-8, mirroring subconverter's regReplace."""
+
+    def __init__(self, rules: list[tuple[str,str]], compile_options: int = PCRE2_UTF,
+                 substitute_options: int = PCRE2_SUBSTITUTE_GLOBAL, lib=None):
+        self.lib = lib or _load_pcre2()
+        if self.lib is None:
+            raise RuntimeError("libpcre2-8 not found; install PCRE2 to run the PCRE engine")
+        self.options = compile_options
+        # OVERFLOW_LENGTH only drives the output-buffer retry loop below
+        self.substitute_options = substitute_options | PCRE2_SUBSTITUTE_OVERFLOW_LENGTH
+        # (rule index, code, replacement); indices follow the TOML order even
+        # when rules that fail to compile are skipped
+        self.rules = []
+        self.errors = {}
+        for i, (m, r) in enumerate(rules, 1):
+            code = self._compile(i, m)
+            if code is not None:
+                self.rules.append((i, code, r.encode("utf8")))
+
+    @property
+    def version(self) -> str:
+        buf = ctypes.create_string_buffer(64)
+        self.lib.pcre2_config_8(PCRE2_CONFIG_VERSION, buf)
+        return buf.value.decode()
+
+    def _error_message(self, code: int) -> str:
+        buf = ctypes.create_string_buffer(256)
+        self.lib.pcre2_get_error_message_8(code, buf, len(buf))
+        return buf.value.decode("utf8", errors="replace")
+
+    def _compile(self, index: int, pattern: str):
+        pat = pattern.encode("utf8")
+        err = ctypes.c_int()
+        offset = ctypes.c_size_t()
+        code = self.lib.pcre2_compile_8(pat, len(pat), self.options, ctypes.byref(err), ctypes.byref(offset), None)
+        if not code:
+            self.errors[index] = f"compile error at {offset.value}: {self._error_message(err.value)}"
+            return None
+        return code
+
+    def _substitute(self, code, subject: bytes, repl: bytes) -> bytes:
+        match_data = self.lib.pcre2_match_data_create_from_pattern_8(code, None)
+        try:
+            size = max(256, 2 * len(subject) + len(repl))
+            while True:
+                buf = ctypes.create_string_buffer(size)
+                out_len = ctypes.c_size_t(size)
+                rc = self.lib.pcre2_substitute_8(
+                    code, subject, len(subject), 0, self.substitute_options,
+                    match_data, None, repl, len(repl), buf, ctypes.byref(out_len),
+                )
+                if rc == PCRE2_ERROR_NOMEMORY:
+                    size = out_len.value + 1
+                    continue
+                if rc < 0:
+                    raise RuntimeError(self._error_message(rc))
+                return buf.raw[:out_len.value]
+        finally:
+            self.lib.pcre2_match_data_free_8(match_data)
+
+    def apply(self, name: str) -> tuple[str, list[tuple[int, str]]]:
+        """Return the renamed `name` and `(rule_index, message)` for each rule PCRE2 rejected."""
+        result = name.encode("utf8")
+        errors = []
+        for index, code, repl in self.rules:
+            try:
+                result = self._substitute(code, result, repl)
+            except RuntimeError as e:
+                # Matches apply_rules: a failing rule leaves the name unchanged
+                errors.append((index, f"substitute error: {e}"))
+        return result.decode("utf8", errors="replace"), errors
+
+    def close(self):
+        for _, code, _ in self.rules:
+            self.lib.pcre2_code_free_8(code)
+        self.rules = []
+
+
+_worker = {}
+
+
+def _init_worker(rules: list[tuple[str,str]], compile_options: int, substitute_options: int):
+    _worker["reference"] = _import_reference()
+    _worker["pcre2"] = Pcre2Engine(rules, compile_options, substitute_options)
+    _worker["rules"] = rules
+
+
+def _run_chunk(names: list[str]) -> list[tuple[str,str,str,list]]:
+    ref, pcre = _worker["reference"], _worker["pcre2"]
+    rules = _worker["rules"]
+    return [(n, ref.apply_rules(n, rules)[0]) + pcre.apply(n) for n in names]
+
+
+def run_engines(names: list[str], rules: list[tuple[str,str]], jobs: int,
+                compile_options: int = PCRE2_UTF,
+                substitute_options: int = PCRE2_SUBSTITUTE_GLOBAL) -> list[tuple[str,str,str,list]]:
+    """Return `(original, regex_result, pcre2_result, pcre2_errors)` for every name, in input order."""
+    chunks = [names[i:i + CHUNK_SIZE] for i in range(0, len(names), CHUNK_SIZE)]
+    initargs = (rules, compile_options, substitute_options)
+    if jobs <= 1 or len(chunks) <= 1:
+        _init_worker(*initargs)
+        return [row for chunk in chunks for row in _run_chunk(chunk)]
+    out = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=initargs) as pool:
+        for rows in pool.map(_run_chunk, chunks):
+            out.extend(rows)
+    return out
+
+
+def flag_names(value: int, table: dict) -> list[str]:
+    return [name for name, bit in table.items() if value & bit]
+
+
+def load_golden(path: str) -> dict:
+    with open(path, "r", encoding="utf8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return data
+    return {r["original"]: r["transformed"] for r in data}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--toml", default=DEFAULT_TOML, help="Path to TOML config")
+    parser.add_argument("--cases", default=None, help="(Optional) path to a Python file with `cases` list or a text file with one case per line")
+    parser.add_argument("--golden", default=None, help="(Optional) expected outputs to compare both engines against")
+    parser.add_argument("--write-golden", action="store_true", help="Write the reference (regex) outputs to --golden (default golden_rename.json)")
+    parser.add_argument("--subconverter", action="store_true", help="Use the PCRE2 options subconverter's regReplace uses (implies --alt-bsux --multiline --extended)")
+    parser.add_argument("--ucp", action="store_true", help="Compile PCRE2 patterns with PCRE2_UCP (Unicode \\w, \\d, \\b)")
+    parser.add_argument("--alt-bsux", action="store_true", help="Compile PCRE2 patterns with PCRE2_ALT_BSUX (JavaScript-style \\x, \\u)")
+    parser.add_argument("--multiline", action="store_true", help="Compile PCRE2 patterns with PCRE2_MULTILINE")
+    parser.add_argument("--unset-empty", action="store_true", help="Substitute unset groups as empty strings (PCRE2_SUBSTITUTE_UNSET_EMPTY)")
+    parser.add_argument("--extended", action="store_true", help="Use PCRE2_SUBSTITUTE_EXTENDED replacement syntax")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="Path of the JSON diff report. Defaults to diff_results.json in script directory.")
+    args = parser.parse_args()
+
+    ref = _import_reference()
+    if getattr(ref.re, '__name__', '') == 're':
+        print("ERROR: the reference engine needs the `regex` package; builtin 're' is in use.")
+        return 5
+    if not os.path.exists(args.toml):
+        print(f"ERROR: TOML file not found: {args.toml}")
+        return 2
+
+    if args.golden and not args.write_golden and not os.path.exists(args.golden):
+        print(f"ERROR: golden file not found: {args.golden}")
+        return 2
+
+    names = ref.load_cases(args.cases) if args.cases else ref.cases
+    rules = ref.parse_rules(ref.load_toml(args.toml))
+
+    if args.subconverter:
+        args.alt_bsux = args.multiline = args.extended = True
+    compile_options = (PCRE2_UTF | (PCRE2_UCP if args.ucp else 0) |
+                       (PCRE2_ALT_BSUX if args.alt_bsux else 0) | (PCRE2_MULTILINE if args.multiline else 0))
+    substitute_options = (PCRE2_SUBSTITUTE_GLOBAL | (PCRE2_SUBSTITUTE_EXTENDED if args.extended else 0) |
+                          (PCRE2_SUBSTITUTE_UNSET_EMPTY if args.unset_empty else 0))
+    pcre2_options = {
+        'compile': flag_names(compile_options, COMPILE_FLAGS),
+        'substitute': flag_names(substitute_options, SUBSTITUTE_FLAGS),
+    }
+
+    try:
+        probe = Pcre2Engine(rules, compile_options, substitute_options)
+    except RuntimeError as e:
+        print(f"ERROR: {e}")
+        return 2
+    print(f"Engines: {ref.re.__name__} {getattr(ref.re, '__version__', '')} vs PCRE2 {probe.version}")
+    print(f"PCRE2 compile options: {' | '.join(pcre2_options['compile'])}")
+    print(f"PCRE2 substitute options: {' | '.join(pcre2_options['substitute'])}")
+    for index, message in sorted(probe.errors.items()):
+        print(f"WARNING: PCRE2 skips rule {index}: {message}")
+    probe.close()
+
+    rows = run_engines(names, rules, args.jobs, compile_options, substitute_options)
+
+    golden = None
+    if args.write_golden:
+        path = args.golden or DEFAULT_GOLDEN
+        with open(path, 'w', encoding='utf8') as f:
+            f.write(json.dumps({n: r for n, r, _, _ in rows}, ensure_ascii=False, indent=2))
+        print(f"Wrote {len(rows)} golden outputs to {path}")
+    elif args.golden:
+        golden = load_golden(args.golden)
+
+    diffs = []
+    # rule index -> {message: number of names}, for rules PCRE2 rejected at match time
+    substitute_errors = {}
+    for name, regex_out, pcre_out, errors in rows:
+        for index, message in errors:
+            counts = substitute_errors.setdefault(index, {})
+            counts[message] = counts.get(message, 0) + 1
+        expected = golden.get(name) if golden is not None else None
+        if regex_out != pcre_out or (expected is not None and expected != regex_out):
+            entry = {'original': name, 'regex': regex_out, 'pcre2': pcre_out}
+            if errors:
+                entry['pcre2_errors'] = [{'rule_index': i, 'error': m} for i, m in errors]
+            if expected is not None:
+                entry['golden'] = expected
+            diffs.append(entry)
+
+    for d in diffs:
+        print('---')
+        print(f"Original: {d['original']}")
+        print(f"  regex : {d['regex']}")
+        print(f"  pcre2 : {d['pcre2']}")
+        for e in d.get('pcre2_errors', []):
+            print(f"  pcre2 rejected rule {e['rule_index']}: {e['error']}")
+        if 'golden' in d:
+            print(f"  golden: {d['golden']}")
+    print(f"{len(diffs)} of {len(rows)} names differ")
+    for index, counts in sorted(substitute_errors.items()):
+        for message, count in counts.items():
+            print(f"WARNING: PCRE2 rejected rule {index} on {count} names: {message}")
+
+    try:
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        with open(args.out, 'w', encoding='utf8') as f:
+            f.write(json.dumps({
+                'total': len(rows),
+                'pcre2_version': probe.version,
+                'pcre2_options': pcre2_options,
+                'diffs': diffs,
+                'pcre2_errors': probe.errors,
+                'pcre2_substitute_errors': substitute_errors,
+            }, ensure_ascii=False, indent=2))
+        print(f"Wrote diff report to {args.out}")
+    except Exception as e:
+        print(f"ERROR: Failed to write to {args.out}: {e}")
+        return 3
+
+    return 4 if diffs else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Scan every rule set in the repository and report how heavy each one is.
+
+Usage: python rule_stats.py [--root PATH] [--out PATH] [--baseline PATH] [--update-md]
+
+Each `.list`, classical `.yaml` and `.mrs` file is read once. For text rule
+sets the report holds counts by rule type, bytes, duplicate and commented-out
+entries and an estimate of the memory a client needs to hold the rules. For
+MRS files it holds bytes plus behavior, count and a memory estimate when
+`zstandard` is installed; without it MRS files count towards bytes only.
+
+With --baseline, growth in rules and bytes is computed against a previously
+saved report (any earlier --out file). With --update-md, a statistics table
+for the rule sets each `.md` index links to is written between the
+`<!-- rule-stats:start -->` / `<!-- rule-stats:end -->` markers of that file
+(appended to the end when the markers are missing). Linked names that match
+no rule set are listed as "not found" and reported as warnings.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import re
+try:
+    import zstandard  # Optional: needed to read MRS headers
+except Exception:
+    zstandard = None
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUT = os.path.join(os.path.dirname(__file__), "rule_stats.json")
+MD_FILES = [
+    "readme.md",
+    "Apple.md",
+    "Game.md",
+    "GlobalMedia.md",
+    os.path.join("Clash-RuleSet-Classical", "readme.md"),
+    os.path.join("Clash-RuleSet-Classical", "Apple.md"),
+    os.path.join("Clash-RuleSet-Classical", "Game.md"),
+    os.path.join("Clash-RuleSet-Classical", "GlobalMedia.md"),
+]
+MD_START = "<!-- rule-stats:start -->"
+MD_END = "<!-- rule-stats:end -->"
+SKIP_DIRS = {".git", "__pycache__", "node_modules"}
+
+# Rough per-rule cost (bytes) of holding a rule in a client such as mihomo:
+# a fixed overhead plus, for string-valued rules, the length of the value.
+MEMORY_COST = {
+    "DOMAIN": (48, True),
+    "DOMAIN-SUFFIX": (56, True),
+    "DOMAIN-KEYWORD": (64, True),
+    "DOMAIN-REGEX": (512, True),
+    "DOMAIN-SET": (56, True),
+    "IP-CIDR": (32, False),
+    "IP-CIDR6": (40, False),
+    "IPCIDR-SET": (32, False),
+}
+DEFAULT_COST = (96, True)
+
+RULE_RE = re.compile(r"^([A-Z][A-Z0-9-]*),(.+)$")
+COMMENTED_RE = re.compile(r"^#+\s*([A-Z][A-Z0-9-]*),")
+CIDR_RE = re.compile(r"^[0-9A-Fa-f:.]+/\d{1,3}$")
+MRS_MAGIC = b"MRS\x01"
+MRS_BEHAVIORS = {0: "domain", 1: "ipcidr"}
+MRS_HEADER_SIZE = 13
+# Decompressed MRS payload per rule (bytes), averaged over this repository's
+# MRS files; the client keeps that payload resident.
+MRS_MEMORY_COST = {"domain": 14, "ipcidr": 15}
+
+
+def _strip_payload_item(line: str):
+    # Mirrors Get-NormalizedPayloadItem in convert-classical-to-mrs.ps1
+    if not line.startswith("-"):
+        return None
+    item = line[1:].strip()
+    if len(item) >= 2 and item[0] == item[-1] and item[0] in "'\"":
+        return item[1:-1]
+    return item
+
+
+def _classify(item: str):
+    m = RULE_RE.match(item)
+    if m:
+        rule_type, rest = m.group(1), m.group(2)
+        return rule_type, rest.split(",", 1)[0].strip()
+    if CIDR_RE.match(item):
+        return "IPCIDR-SET", item
+    if "." in item and " " not in item:
+        return "DOMAIN-SET", item
+    return None, item
+
+
+def scan_text(path: str, yaml: bool) -> dict:
+    """Return statistics for one `.list` or classical `.yaml` rule set."""
+    with open(path, "rb") as f:
+        data = f.read()
+    types = {}
+    seen = set()
+    duplicates = 0
+    commented = 0
+    invalid = 0
+    memory = 0
+    for raw in data.decode("utf-8-sig", errors="replace").splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            if COMMENTED_RE.match(line):
+                commented += 1
+            continue
+        if yaml:
+            if line == "payload:":
+                continue
+            item = _strip_payload_item(line)
+            if item is None:
+                invalid += 1
+                continue
+            if item.startswith("#"):
+                if COMMENTED_RE.match(item):
+                    commented += 1
+                continue
+        else:
+            item = line
+        rule_type, value = _classify(item)
+        if rule_type is None:
+            invalid += 1
+            continue
+        types[rule_type] = types.get(rule_type, 0) + 1
+        key = (rule_type, value.lower())
+        if key in seen:
+            duplicates += 1
+        else:
+            seen.add(key)
+        base, per_char = MEMORY_COST.get(rule_type, DEFAULT_COST)
+        memory += base + (len(value) if per_char else 0)
+    return {
+        "format": "yaml" if yaml else "list",
+        "bytes": len(data),
+        "rules": sum(types.values()),
+        "types": dict(sorted(types.items())),
+        "duplicates": duplicates,
+        "commented": commented,
+        "invalid": invalid,
+        "est_memory": memory,
+    }
+
+
+def scan_mrs(path: str) -> dict:
+    """Return statistics for one `.mrs` file (header fields need `zstandard`).
+
+    `est_memory` is the rule count times MRS_MEMORY_COST for the behavior.
+    """
+    out = {"format": "mrs", "bytes": os.path.getsize(path)}
+    if zstandard is None:
+        return out
+    try:
+        with open(path, "rb") as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f)
+            header = b""
+            # stream_reader may return fewer bytes than asked for
+            while len(header) < MRS_HEADER_SIZE:
+                chunk = reader.read(MRS_HEADER_SIZE - len(header))
+                if not chunk:
+                    break
+                header += chunk
+    except Exception as e:
+        out["error"] = f"decompress error: {e}"
+        return out
+    if len(header) < MRS_HEADER_SIZE or header[:4] != MRS_MAGIC:
+        out["error"] = "not an MRS file"
+        return out
+    out["behavior"] = MRS_BEHAVIORS.get(header[4], str(header[4]))
+    out["rules"] = int.from_bytes(header[5:13], "big")
+    if out["behavior"] in MRS_MEMORY_COST:
+        out["est_memory"] = out["rules"] * MRS_MEMORY_COST[out["behavior"]]
+    return out
+
+
+def scan_tree(root: str) -> dict:
+    """Scan all rule sets below `root`, keyed by POSIX path relative to it."""
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, root).replace(os.sep, "/")
+            if name.endswith(".list"):
+                files[rel] = scan_text(path, yaml=False)
+            elif name.endswith(".mrs"):
+                files[rel] = scan_mrs(path)
+            elif name.endswith(".yaml") and rel.startswith("Clash-RuleSet-Classical/"):
+                files[rel] = scan_text(path, yaml=True)
+    return files
+
+
+def add_growth(files: dict, baseline: dict) -> None:
+    """Annotate `files` in place with growth relative to `baseline` files."""
+    for rel, stats in files.items():
+        old = baseline.get(rel)
+        if old is None:
+            stats["growth"] = {"new": True}
+            continue
+        growth = {"bytes": stats["bytes"] - old.get("bytes", 0)}
+        if "rules" in stats and "rules" in old:
+            growth["rules"] = stats["rules"] - old["rules"]
+            if old["rules"]:
+                growth["rules_pct"] = round(100.0 * growth["rules"] / old["rules"], 2)
+        stats["growth"] = growth
+
+
+def _human(n: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(n) < 1024 or unit == "MiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024.0
+
+
+def _resolve_link(base: str, ref: str, files: dict) -> str | None:
+    if base.startswith("Clash-RuleSet-Classical") and ref.endswith(".list"):
+        # Classical indexes name sets by their `.list` source; the set there
+        # is the `.yaml` of the same name
+        ref = ref[:-len(".list")] + ".yaml"
+    candidates = [ref, os.path.normpath(os.path.join(base, ref)).replace(os.sep, "/")]
+    if "/" not in ref and base:
+        # Bare names (as in readme.md tables) resolve next to the index first
+        candidates.insert(0, f"{base}/{ref}")
+    for c in candidates:
+        if c in files:
+            return c
+    if "/" in ref:
+        return None
+    # Bare names may live in a subfolder (`Special/`, `PROXY/`, `Adblock/`)
+    # and differ in case (`NTP-service` vs `NTP-Service`): take the shallowest
+    prefix = f"{base}/" if base else ""
+    name = ref.lower()
+    matches = [p for p in files if p.startswith(prefix) and p.rsplit("/", 1)[-1].lower() == name]
+    if matches:
+        return min(matches, key=lambda p: (p.count("/"), p))
+    return None
+
+
+def _linked_files(md_path: str, text: str, files: dict) -> tuple[list[str], list[str]]:
+    """Return `(paths, missing)` for the rule sets linked from an index.
+
+    `paths` keeps link order and holds the linked name itself for links
+    that resolve to no scanned file; those names are also in `missing`.
+    """
+    base = os.path.dirname(md_path)
+    out = []
+    missing = []
+    for ref in re.findall(r"([\w.\-/]+\.(?:list|yaml))\b", text):
+        if "/blob/master/" in ref:
+            ref = ref.split("/blob/master/", 1)[1]
+        rel = _resolve_link(base, ref, files)
+        if rel is None:
+            rel = ref
+            if ref not in missing:
+                missing.append(ref)
+        if rel not in out:
+            out.append(rel)
+    return out, missing
+
+
+def render_table(paths: list[str], files: dict) -> str:
+    lines = [
+        "| File | Rules | Top types | Duplicates | Commented | Size | Est. memory |",
+        "| ---- | ----: | --------- | ---------: | --------: | ---: | ----------: |",
+    ]
+    for rel in paths:
+        if rel not in files:
+            lines.append(f"| {rel} (not found) | - | - | - | - | - | - |")
+            continue
+        s = files[rel]
+        top = sorted(s.get("types", {}).items(), key=lambda kv: -kv[1])[:3]
+        top_text = ", ".join(f"{t} {n}" for t, n in top)
+        lines.append(
+            f"| {rel} | {s.get('rules', '-')} | {top_text} | {s.get('duplicates', '-')} | "
+            f"{s.get('commented', '-')} | {_human(s['bytes'])} | {_human(s.get('est_memory', 0))} |"
+        )
+    return "\n".join(lines)
+
+
+def update_md(root: str, md_rel: str, files: dict) -> bool:
+    path = os.path.join(root, md_rel)
+    if not os.path.exists(path):
+        return False
+    with open(path, "r", encoding="utf8") as f:
+        text = f.read()
+    head, sep, rest = text.partition(MD_START)
+    body = text if not sep else head + rest.partition(MD_END)[2]
+    paths, missing = _linked_files(md_rel.replace(os.sep, "/"), body, files)
+    for ref in missing:
+        print(f"WARNING: {md_rel} links {ref}, which matches no rule set")
+    if not paths:
+        return False
+    block = f"{MD_START}\n{render_table(paths, files)}\n{MD_END}"
+    if sep:
+        text = head + block + rest.partition(MD_END)[2]
+    else:
+        text = text.rstrip("\n") + "\n\n" + block + "\n"
+    with open(path, "w", encoding="utf8", newline="") as f:
+        f.write(text)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=ROOT_DIR, help="Repository root to scan")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="Path of the JSON report. Defaults to rule_stats.json in script directory.")
+    parser.add_argument("--baseline", default=None, help="(Optional) previous JSON report to compute growth against")
+    parser.add_argument("--warn-growth", type=float, default=10.0, help="Print rule sets whose rule count grew by more than this percentage")
+    parser.add_argument("--update-md", action="store_true", help="Regenerate the statistics tables in the .md indexes")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        print(f"ERROR: root directory not found: {args.root}")
+        return 2
+
+    files = scan_tree(args.root)
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            print(f"ERROR: baseline report not found: {args.baseline}")
+            return 2
+        with open(args.baseline, "r", encoding="utf8") as f:
+            add_growth(files, json.load(f).get("files", {}))
+        for rel, s in files.items():
+            pct = s["growth"].get("rules_pct")
+            if pct is not None and pct > args.warn_growth:
+                print(f"WARNING: {rel} grew {pct}% ({s['growth']['rules']:+d} rules)")
+
+    totals = {
+        "files": len(files),
+        "bytes": sum(s["bytes"] for s in files.values()),
+        "rules": sum(s.get("rules", 0) for s in files.values() if s["format"] != "mrs"),
+        "duplicates": sum(s.get("duplicates", 0) for s in files.values()),
+        "commented": sum(s.get("commented", 0) for s in files.values()),
+        "est_memory": sum(s.get("est_memory", 0) for s in files.values()),
+    }
+    report = {"totals": totals, "files": files}
+
+    try:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf8") as f:
+            f.write(json.dumps(report, ensure_ascii=False, indent=2))
+        print(f"Wrote statistics for {totals['files']} files to {args.out}")
+    except Exception as e:
+        print(f"ERROR: Failed to write to {args.out}: {e}")
+        return 3
+    if zstandard is None:
+        print("Note: install `zstandard` to include MRS behavior, rule counts and memory estimates.")
+
+    if args.update_md:
+        for md_rel in MD_FILES:
+            if update_md(args.root, md_rel, files):
+                print(f"Updated table in {md_rel}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
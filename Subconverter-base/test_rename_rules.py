@@ -2,10 +2,12 @@
 """
 Test script to validate `node_pref.rename_node` rules in `AllSub-AdBlock.toml`.
 
-Usage: python test_rename_rules.py [--toml PATH] [--cases PATH]
+Usage: python test_rename_rules.py [--toml PATH] [--cases PATH] [--prestage]
 
 It parses the TOML file, extracts all rename rules, and sequentially applies them
 to the provided test cases, printing transformations and the applied rules.
+With --prestage the cases first pass through `prestage`, which normalizes
+Unicode, drops `exclude_remarks`/pseudo nodes and numbers duplicate results.
 """
 from __future__ import annotations
 import argparse
@@ -13,6 +15,7 @@ import json
 import os
 import sys
 import codecs
+import unicodedata
 try:
     import tomllib  # Python 3.11+
 except Exception:
@@ -73,6 +76,12 @@ except Exception:
 
 DEFAULT_TOML = os.path.join(os.path.dirname(__file__), "AllSub-AdBlock.toml")
 DEFAULT_OUT = os.path.join(os.path.dirname(__file__), "results.json")
+# Traffic/expiry/advert pseudo-nodes dropped by --prestage on top of `exclude_remarks`.
+# A leading `☠️` alone is not enough: providers also use it for unknown-region nodes.
+PSEUDO_REMARKS = [r"(?i)剩余流量|流量[:：]|到期时间|过期时间|expire[:：]|^♥|防失联|https?://|t\.me/"]
+# Always kept out of NFKC: enclosed alphanumerics (`①`, `⑫`, `Ⓜ`) and dingbat
+# circled digits (`❶`) that providers use as node numbers and region marks.
+PROTECTED_RANGES = [(0x2460, 0x24FF), (0x2776, 0x2793)]
 
 # Default cases provided by user attachment
 cases = [
@@ -543,6 +552,17 @@ def load_toml(path: str):
         return tomllib.load(io.BytesIO(data))
 
 
+def load_cases(path: str) -> list[str]:
+    """Load names from a Python file defining `cases`, or one name per line."""
+    if path.endswith('.py'):
+        ns = {}
+        with open(path, 'r', encoding='utf8') as f:
+            exec(f.read(), ns)
+        return ns.get('cases', [])
+    with open(path, 'r', encoding='utf8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
 def parse_rules(data: dict):
     out = []
     node_pref = data.get("node_pref") or {}
@@ -617,6 +637,97 @@ def apply_rules(name: str, rules: list[tuple[str,str]], first: bool = False):
     return result, applied
 
 
+def parse_excludes(data: dict):
+    custom = data.get("custom") or {}
+    return list(custom.get("exclude_remarks", []) or [])
+
+
+def protected_chars(patterns) -> frozenset:
+    """Return the non-ASCII characters `patterns` can match literally.
+
+    Covers literal characters, `\\x{...}` escapes and ranges built from either
+    (`[\\x{2600}-\\x{27BF}]`), plus PROTECTED_RANGES. `\\p{Han}` / `\\p{RI}` need
+    nothing: NFKC leaves ideographs and regional indicators alone.
+    """
+    import re as _stdre
+
+    def _char(tok: str) -> int:
+        return int(tok[3:-1], 16) if tok.startswith('\\x{') else ord(tok)
+
+    out = set()
+    for lo, hi in PROTECTED_RANGES:
+        out.update(map(chr, range(lo, hi + 1)))
+    atom = r"(\\x\{[0-9A-Fa-f]+\}|[^\x00-\x7f])"
+    for pat in patterns:
+        for lo, hi in _stdre.findall(atom + "-" + atom, pat):
+            out.update(map(chr, range(_char(lo), _char(hi) + 1)))
+        out.update(chr(_char(tok)) for tok in _stdre.findall(atom, pat))
+    return frozenset(ch for ch in out if ord(ch) > 0x7F)
+
+
+def normalize_name(name: str, protected: frozenset = frozenset()) -> str:
+    # NFKC-fold everything except characters the rules match literally
+    # (e.g. `⓪` would otherwise become `0` and stop matching its rule).
+    out = []
+    run = []
+    for ch in name:
+        if ch in protected:
+            if run:
+                out.append(unicodedata.normalize('NFKC', ''.join(run)))
+                run = []
+            out.append(ch)
+        else:
+            run.append(ch)
+    if run:
+        out.append(unicodedata.normalize('NFKC', ''.join(run)))
+    name = ''.join(out)
+    # Drop zero-width joiners that do not join two visible characters
+    name = re.sub(r"(?<!\S)\u200d|\u200d(?!\S)", "", name)
+    # Drop variation selectors left behind on ASCII or spaces once their
+    # base was folded (`ℹ️` -> `i️`), but keep keycaps such as `1️⃣`
+    name = re.sub(r"(?<![^\x00-\x7f\s])[\ufe0e\ufe0f](?!\u20e3)", "", name)
+    # Separate a leading flag from the remark: `🇭🇰香港` -> `🇭🇰 香港`
+    name = re.sub(r"^([\U0001F1E6-\U0001F1FF]{2})(?=\S)", r"\1 ", name)
+    return " ".join(name.split())
+
+
+def prestage(names, rules: list[tuple[str,str]], excludes: list[str], first: bool = False):
+    """Normalize, filter and rename `names` in one streaming pass.
+
+    Yields `(original, normalized, final, applied)` for every kept node. Nodes whose
+    normalized name matches any `excludes` pattern are skipped. Identical
+    normalized names are renamed only once, and identical final names get
+    ` #2`, ` #3`, ... appended in order of first appearance so the numbering
+    is stable across runs over the same input. The `#` keeps the suffix
+    apart from the ` 2` style numbers rename output already uses, so a
+    duplicate never takes the name of a real node.
+    """
+    protected = protected_chars([m for m, _ in rules] + list(excludes))
+    exclude_patterns = [compile_pattern(p) for p in excludes]
+    renamed = {}
+    used = set()
+    seen = {}
+    for original in names:
+        normalized = normalize_name(original, protected)
+        if not normalized or any(p.search(normalized) for p in exclude_patterns):
+            continue
+        cached = renamed.get(normalized)
+        if cached is None:
+            cached = apply_rules(normalized, rules, first=first)
+            renamed[normalized] = cached
+        final, applied = cached
+        if final in used:
+            n = seen.get(final, 1)
+            candidate = final
+            while candidate in used:
+                n += 1
+                candidate = f"{final} #{n}"
+            seen[final] = n
+            final = candidate
+        used.add(final)
+        yield original, normalized, final, applied
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--toml", default=DEFAULT_TOML, help="Path to TOML config")
@@ -625,6 +736,8 @@ def main():
     parser.add_argument("--out", default=DEFAULT_OUT, help="(Optional) path to output file. Extension .json writes JSON, otherwise plain text. Defaults to results.json in script directory.")
     parser.add_argument("--first", action="store_true", help="Only replace first match per rule (simulate count=1)")
     parser.add_argument("--require-regex", action="store_true", help="Require third-party `regex` module; exit with error if not available")
+    parser.add_argument("--prestage", action="store_true", help="Normalize names, drop excluded/pseudo nodes and number duplicate results before output")
+    parser.add_argument("--exclude", action="append", default=[], help="Extra exclude_remarks-style pattern for --prestage (repeatable)")
     args = parser.parse_args()
 
     if not os.path.exists(args.toml):
@@ -632,18 +745,7 @@ def main():
         return 2
 
     # load test cases (either from file or default 'cases')
-    if args.cases:
-        if args.cases.endswith('.py'):
-            ns = {}
-            with open(args.cases, 'r', encoding='utf8') as f:
-                code = f.read()
-            exec(code, ns)
-            testcases = ns.get('cases', [])
-        else:
-            with open(args.cases, 'r', encoding='utf8') as f:
-                testcases = [line.strip() for line in f if line.strip()]
-    else:
-        testcases = cases
+    testcases = load_cases(args.cases) if args.cases else cases
 
     toml_data = load_toml(args.toml)
     rules = parse_rules(toml_data)
@@ -652,11 +754,25 @@ def main():
         print("Error: builtin 're' is in use and '--require-regex' specified. Please install 'regex'.")
         return 5
 
+    if args.prestage:
+        excludes = parse_excludes(toml_data) + PSEUDO_REMARKS + args.exclude
+        for pat in excludes:
+            try:
+                compile_pattern(pat)
+            except Exception as e:
+                print(f"ERROR: invalid exclude pattern {pat!r}: {e}")
+                return 2
+        staged = list(prestage(testcases, rules, excludes, first=args.first))
+        print(f"Prestage kept {len(staged)} of {len(testcases)} nodes "
+              f"({len({n for _, n, _, _ in staged})} distinct names renamed)")
+    else:
+        staged = [(case, case) + apply_rules(case, rules, first=args.first) for case in testcases]
+
     results = []
-    for case in testcases:
-        transformed, applied = apply_rules(case, rules, first=args.first)
+    for case, normalized, transformed, applied in staged:
         results.append({
             'original': case,
+            'normalized': normalized,
             'transformed': transformed,
             'applied': [
                 {
@@ -722,6 +838,25 @@ def main():
             elif res_map[k] != v:
                 print(f"ERROR: expected {k} -> {v}, got {res_map[k]}")
                 raise SystemExit(4)
+        if args.prestage:
+            # Duplicates are numbered without taking an existing real name
+            dedup = [final for _, _, final, _ in prestage(['A', 'A', 'A 2'], [], [])]
+            if dedup != ['A', 'A #2', 'A 2']:
+                print(f"ERROR: expected duplicates ['A', 'A', 'A 2'] -> ['A', 'A #2', 'A 2'], got {dedup}")
+                raise SystemExit(4)
+            expected_kept = {
+                '🇸🇬 Tencent SG 无限流量': True,
+                '☠️ Channel: https://t.me/txwl666': False,
+                '☠️ Group: https://t.me/txwl233': False,
+                '♥流量:10620.7GB 等级6剩:1512.6天': False,
+                '防失联 ftqfabu.com': False,
+            }
+            for k, v in expected_kept.items():
+                if k not in testcases:
+                    print(f"WARNING: test case not present: {k}")
+                elif (k in res_map) != v:
+                    print(f"ERROR: expected {k} to be {'kept' if v else 'dropped'} by --prestage")
+                    raise SystemExit(4)
     except Exception:
         pass
 